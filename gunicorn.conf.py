@@ -0,0 +1,20 @@
+import multiprocessing
+import os
+
+# Threaded workers: SQLite, uploads and CSV streaming all block on I/O, so a
+# handful of threads per process keeps requests from queueing behind each other.
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+_workers = os.environ.get("GUNICORN_WORKERS", "auto").strip().lower()
+workers = min(2 * multiprocessing.cpu_count() + 1, 16) if _workers == "auto" else int(_workers)
+
+# Import server.py (and run init_db) once in the master, then fork workers
+preload_app = True
+
+# Recycle workers periodically; jitter stops them all restarting together
+max_requests = 100000
+max_requests_jitter = 100
+
+accesslog = None if os.environ.get("DISABLE_ACCESS_LOG", "").strip().lower() in ("1", "true", "yes") else "-"
@@ -1,43 +1,259 @@
+import atexit
 import base64
-import csv
-import io
+import concurrent.futures
+import functools
+import gzip
+import hashlib
 import json
+import mimetypes
+import operator
 import os
 import re
 import shutil
 import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from pathlib import Path
-from uuid import uuid4
-from datetime import datetime
+from datetime import date, datetime
 
-from flask import Flask, jsonify, request, send_from_directory, g, Response
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from flask import Flask, jsonify, request, send_from_directory, Response, stream_with_context
+from flask.json.provider import JSONProvider
+import orjson
 import requests
-from werkzeug.utils import secure_filename
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 ROOT = Path(__file__).resolve().parent
 # Allow overriding DB path via env for Docker persistence
 DB_PATH = Path(os.environ.get("DATABASE_PATH") or (ROOT / "finance.db"))
 UPLOAD_DIR = Path(os.environ.get("UPLOADS_DIR") or (ROOT / "uploads"))
+# Plain-string copies for per-request path handling (cheaper than Path ops)
+ROOT_STR = str(ROOT)
+UPLOAD_DIR_STR = str(UPLOAD_DIR)
+UPLOAD_DIR_REAL = os.path.realpath(UPLOAD_DIR_STR)
+# Prefix of an nginx `internal` location aliased to UPLOAD_DIR (e.g. /_uploads);
+# when set, attachment downloads are handed to nginx via X-Accel-Redirect
+UPLOADS_ACCEL_PREFIX = (os.environ.get("UPLOADS_ACCEL_PREFIX") or "").strip().rstrip("/")
+
+
+class OrjsonProvider(JSONProvider):
+    # Encode jsonify()/get_json() payloads with orjson's C encoder. Anything
+    # orjson rejects (e.g. integers beyond 64 bits echoed back from a model)
+    # falls back to the stdlib encoder.
+    def _encode(self, obj) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        return self._encode(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Pass orjson's UTF-8 bytes straight through instead of decoding to
+        # str for the response class to encode again
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj), mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+# Behind Apache (mod_xsendfile) or lighttpd, let the web server stream
+# attachment and static files itself instead of copying them through Python.
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "").strip().lower() in ("1", "true", "yes")
+
+# Shared HTTP client for LLM calls so repeated receipt scans reuse the pooled
+# keep-alive connection (and TLS session) instead of reconnecting every time.
+_LLM_SESSION = requests.Session()
+_llm_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=2,
+        # Never resend once the request went out: a read timeout would repeat a
+        # 60 s wait and re-bill the model for the same receipt
+        read=0,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    ),
+)
+_LLM_SESSION.mount("https://", _llm_adapter)
+_LLM_SESSION.mount("http://", _llm_adapter)
+
+# journal_mode=WAL is persisted in the database file, so it only needs setting
+# once per process; the remaining PRAGMAs are per-connection.
+_wal_enabled = False
+
+
+def _apply_pragmas(db: sqlite3.Connection):
+    global _wal_enabled
+    if not _wal_enabled:
+        db.execute("PRAGMA journal_mode=WAL")
+        _wal_enabled = True
+    db.executescript(
+        """
+        PRAGMA synchronous=NORMAL;
+        PRAGMA busy_timeout=5000;
+        PRAGMA cache_size=-20000;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+        PRAGMA foreign_keys=ON;
+        """
+    )
+
+
+# One long-lived connection per worker thread, reused across requests so the
+# page cache and PRAGMA setup survive between them.
+_local = threading.local()
+
+
+class _Connection(sqlite3.Connection):
+    # Plain sqlite3.Connection can't be weakly referenced; the subclass can
+    pass
+
+
+# Every live per-thread connection, so exit can reach those of worker threads
+# (atexit runs on the main thread and only sees its own thread-local)
+_connections = weakref.WeakSet()
 
 
 def get_db() -> sqlite3.Connection:
-    if "db" not in g:
-        g.db = sqlite3.connect(DB_PATH)
-        g.db.row_factory = sqlite3.Row
-    return g.db
+    db = getattr(_local, "db", None)
+    # Connections must not be shared across fork() (e.g. gunicorn --preload)
+    if db is None or _local.pid != os.getpid():
+        # Autocommit: reads never hold a transaction open; writes that span
+        # several statements use write_transaction()
+        db = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, factory=_Connection)
+        db.row_factory = sqlite3.Row
+        _apply_pragmas(db)
+        db.pid = os.getpid()
+        _connections.add(db)
+        _local.db = db
+        _local.pid = os.getpid()
+        _local.uses = 0
+    return db
+
+
+@contextmanager
+def write_transaction(db: sqlite3.Connection):
+    # Take the write lock up front so concurrent writers queue on busy_timeout
+    # instead of failing mid-transaction on a lock upgrade
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+
+
+# Long-lived connections never close between requests, so let SQLite refresh
+# planner statistics every so often (a no-op unless tables changed enough)
+OPTIMIZE_EVERY = 1000
+
+
+def _optimize(db: sqlite3.Connection):
+    try:
+        db.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass
 
 
 @app.teardown_appcontext
-def close_db(_):
-    db = g.pop("db", None)
-    if db is not None:
+def release_db(_):
+    # The connection outlives the request; never leak an open transaction
+    db = getattr(_local, "db", None)
+    if db is None:
+        return
+    if db.in_transaction:
+        db.rollback()
+    _local.uses += 1
+    if _local.uses % OPTIMIZE_EVERY == 0:
+        _optimize(db)
+
+
+def close_db():
+    db = getattr(_local, "db", None)
+    if db is not None and _local.pid == os.getpid():
+        _connections.discard(db)
         db.close()
+        _local.db = None
+
+
+@atexit.register
+def close_all_db():
+    # Refresh planner statistics and close every connection this process
+    # opened, whichever thread it belongs to
+    pid = os.getpid()
+    for db in list(_connections):
+        if db.pid != pid:
+            continue
+        _optimize(db)
+        try:
+            db.close()
+        except sqlite3.Error:
+            pass
+
+
+# Bump when init_db gains a new migration step
+SCHEMA_VERSION = 4
+
+# Per-table write counters kept by triggers, so any process can tell cheaply
+# whether a table changed (used to revalidate cached list responses)
+_CHANGE_COUNTER_SQL = """
+CREATE TABLE IF NOT EXISTS change_counters (
+    tbl TEXT PRIMARY KEY,
+    n INTEGER NOT NULL DEFAULT 0
+);
+""" + "".join(
+    f"""
+INSERT OR IGNORE INTO change_counters (tbl) VALUES ('{table}');
+CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_count AFTER {event} ON {table}
+BEGIN
+    UPDATE change_counters SET n = n + 1 WHERE tbl = '{table}';
+END;
+"""
+    for table in ("incomes", "expenses", "payroll")
+    for event in ("INSERT", "UPDATE", "DELETE")
+)
+
+
+@contextmanager
+def _schema_lock():
+    # Serialize init_db across processes importing the app at once (gunicorn
+    # without preload, several containers on one volume)
+    if fcntl is None:
+        yield
+        return
+    with open(DB_PATH.with_suffix(".lock"), "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
 
 
 def init_db():
     db = get_db()
+    # Whoever held the schema lock first already did the work
+    if db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        try:
+            UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        except Exception:
+            pass
+        return
     db.executescript(
         """
         CREATE TABLE IF NOT EXISTS incomes (
@@ -90,34 +306,47 @@ def init_db():
         );
         CREATE INDEX IF NOT EXISTS idx_attachments_kind_record ON attachments(kind, record_id);
 
+        CREATE INDEX IF NOT EXISTS idx_incomes_date_updated ON incomes(date DESC, updated_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_expenses_date_updated ON expenses(date DESC, updated_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_payroll_date_updated ON payroll(date DESC, updated_at DESC);
+
         CREATE TABLE IF NOT EXISTS settings (
             key TEXT PRIMARY KEY,
             value TEXT
         );
         """
     )
-    db.commit()
-    # Migrations for existing databases
-    try:
-        cols = {r[1] for r in db.execute("PRAGMA table_info(expenses)").fetchall()}
-        if "paid_from" not in cols:
-            db.execute("ALTER TABLE expenses ADD COLUMN paid_from TEXT")
-        if "delivery_fee" not in cols:
-            db.execute("ALTER TABLE expenses ADD COLUMN delivery_fee REAL DEFAULT 0")
-        db.commit()
-    except Exception:
-        pass
-    try:
-        db.execute(
-            "UPDATE expenses SET paid_from = ? WHERE paid_from IS NULL OR paid_from = ''",
-            ("Tomasz Burzy Personal",),
-        )
-        db.execute(
-            "UPDATE expenses SET delivery_fee = 0 WHERE delivery_fee IS NULL",
-        )
-        db.commit()
-    except Exception:
-        pass
+    # Migrations for existing databases; PRAGMA user_version records that they
+    # ran so later startups skip the table scans
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version < 2:
+        try:
+            with write_transaction(db):
+                cols = {r[1] for r in db.execute("PRAGMA table_info(expenses)").fetchall()}
+                if "paid_from" not in cols:
+                    db.execute("ALTER TABLE expenses ADD COLUMN paid_from TEXT")
+                if "delivery_fee" not in cols:
+                    db.execute("ALTER TABLE expenses ADD COLUMN delivery_fee REAL DEFAULT 0")
+        except Exception:
+            pass
+        try:
+            with write_transaction(db):
+                db.execute(
+                    "UPDATE expenses SET paid_from = ? WHERE paid_from IS NULL OR paid_from = ''",
+                    ("Tomasz Burzy Personal",),
+                )
+                db.execute(
+                    "UPDATE expenses SET delivery_fee = 0 WHERE delivery_fee IS NULL",
+                )
+        except Exception:
+            pass
+    if version < 3:
+        # Give the planner statistics so it picks the date/updated_at indexes
+        db.execute("ANALYZE")
+    if version < 4:
+        db.executescript(_CHANGE_COUNTER_SQL)
+    if version < SCHEMA_VERSION:
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     # Ensure upload base directory exists
     try:
         UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
@@ -126,7 +355,12 @@ def init_db():
 
 
 def generate_id() -> str:
-    return uuid4().hex
+    # 48-bit millisecond timestamp + 80 random bits, still 32 hex chars: new
+    # rows append to the right edge of the primary-key B-tree
+    return f"{time.time_ns() // 1_000_000:012x}{os.urandom(10).hex()}"
+
+
+_SAFE_EXT_RE = re.compile(r"\.[A-Za-z0-9]{1,15}")
 
 
 def _ensure_record_dir(kind: str, record_id: str) -> Path:
@@ -136,9 +370,7 @@ def _ensure_record_dir(kind: str, record_id: str) -> Path:
 
 
 def _remove_record_dir(kind: str, record_id: str):
-    path = UPLOAD_DIR / kind / record_id
-    if path.exists() and path.is_dir():
-        shutil.rmtree(path, ignore_errors=True)
+    shutil.rmtree(UPLOAD_DIR / kind / record_id, ignore_errors=True)
 
 
 def _attachment_row_to_dict(row: sqlite3.Row) -> dict:
@@ -157,37 +389,110 @@ def _attachment_row_to_dict(row: sqlite3.Row) -> dict:
     }
 
 
+def _income_to_db(payload: dict) -> dict:
+    return {
+        "id": str(payload.get("id") or generate_id()),
+        "date": (payload.get("date") or "").strip(),
+        "source": (payload.get("source") or "").strip(),
+        "processor": (payload.get("processor") or "").strip(),
+        "amount": float(payload.get("amount") or 0),
+        "fees": float(payload.get("fees") or 0),
+        "notes": (payload.get("notes") or "").strip(),
+    }
+
+
+def _income_from_db(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "date": row["date"],
+        "source": row["source"] or "",
+        "processor": row["processor"] or "",
+        "amount": float(row["amount"] or 0),
+        "fees": float(row["fees"] or 0),
+        "notes": row["notes"] or "",
+    }
+
+
+def _expense_to_db(payload: dict) -> dict:
+    return {
+        "id": str(payload.get("id") or generate_id()),
+        "date": (payload.get("date") or "").strip(),
+        "category": (payload.get("category") or "").strip(),
+        "seller": (payload.get("seller") or "").strip(),
+        "items": (payload.get("items") or "").strip(),
+        "order_number": (payload.get("orderNumber") or payload.get("order_number") or "").strip(),
+        "total": float(payload.get("total") or payload.get("price") or 0),
+        "notes": (payload.get("notes") or "").strip(),
+        "source": (payload.get("source") or "").strip(),
+        "paid_from": (payload.get("paidFrom") or payload.get("paid_from") or "").strip(),
+        "delivery_fee": float(payload.get("deliveryFee") or payload.get("delivery_fee") or 0),
+    }
+
+
+def _expense_from_db(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "date": row["date"],
+        "category": row["category"] or "",
+        "seller": row["seller"] or "",
+        "items": row["items"] or "",
+        "orderNumber": row["order_number"] or "",
+        "total": float(row["total"] or 0),
+        "notes": row["notes"] or "",
+        "source": row["source"] or "",
+        "paidFrom": row["paid_from"] or "",
+        "deliveryFee": float(row["delivery_fee"] or 0),
+    }
+
+
+def _payroll_to_db(payload: dict) -> dict:
+    return {
+        "id": str(payload.get("id") or generate_id()),
+        "date": (payload.get("date") or "").strip(),
+        "employee": (payload.get("employee") or "").strip(),
+        "amount": float(payload.get("amount") or 0),
+        "notes": (payload.get("notes") or "").strip(),
+    }
+
+
+def _payroll_from_db(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "date": row["date"],
+        "employee": row["employee"] or "",
+        "amount": float(row["amount"] or 0),
+        "notes": row["notes"] or "",
+    }
+
+
 RESOURCE_CONFIG = {
     "income": {
         "table": "incomes",
         "columns": ["id", "date", "source", "processor", "amount", "fees", "notes"],
-        "to_db": lambda payload: {
-            "id": str(payload.get("id") or generate_id()),
-            "date": (payload.get("date") or "").strip(),
-            "source": (payload.get("source") or "").strip(),
-            "processor": (payload.get("processor") or "").strip(),
-            "amount": float(payload.get("amount") or 0),
-            "fees": float(payload.get("fees") or 0),
-            "notes": (payload.get("notes") or "").strip(),
-        },
-        "from_db": lambda row: {
-            "id": row["id"],
-            "date": row["date"],
-            "source": row["source"] or "",
-            "processor": row["processor"] or "",
-            "amount": float(row["amount"] or 0),
-            "fees": float(row["fees"] or 0),
-            "notes": row["notes"] or "",
-        },
+        "to_db": _income_to_db,
+        "from_db": _income_from_db,
+        # from_db done in SQL, for list responses built with dict(row)
+        "list_columns": [
+            "id",
+            "date",
+            "IFNULL(source, '') AS source",
+            "IFNULL(processor, '') AS processor",
+            "IFNULL(amount, 0.0) AS amount",
+            "IFNULL(fees, 0.0) AS fees",
+            "IFNULL(notes, '') AS notes",
+        ],
         "csv_header": ["Date", "Source", "Processor", "AmountGBP", "FeesGBP", "Notes"],
-        "csv_row": lambda rec: [
-            rec["date"],
-            rec["source"],
-            rec["processor"],
-            f'{rec["amount"]:.2f}',
-            f'{rec["fees"]:.2f}',
-            rec["notes"],
+        # SQLite fills NULLs and orders the columns for the export; money is
+        # still formatted in Python, as SQLite's printf rounds differently
+        "csv_columns": [
+            "date",
+            "IFNULL(source, '')",
+            "IFNULL(processor, '')",
+            "IFNULL(amount, 0)",
+            "IFNULL(fees, 0)",
+            "IFNULL(notes, '')",
         ],
+        "csv_row": lambda r: (r[0], r[1], r[2], f"{r[3]:.2f}", f"{r[4]:.2f}", r[5]),
     },
     "expenses": {
         "table": "expenses",
@@ -204,144 +509,208 @@ RESOURCE_CONFIG = {
             "paid_from",
             "delivery_fee",
         ],
-        "to_db": lambda payload: {
-            "id": str(payload.get("id") or generate_id()),
-            "date": (payload.get("date") or "").strip(),
-            "category": (payload.get("category") or "").strip(),
-            "seller": (payload.get("seller") or "").strip(),
-            "items": (payload.get("items") or "").strip(),
-            "order_number": (payload.get("orderNumber") or payload.get("order_number") or "").strip(),
-            "total": float(payload.get("total") or payload.get("price") or 0),
-            "notes": (payload.get("notes") or "").strip(),
-            "source": (payload.get("source") or "").strip(),
-            "paid_from": (payload.get("paidFrom") or payload.get("paid_from") or "").strip(),
-            "delivery_fee": float(payload.get("deliveryFee") or payload.get("delivery_fee") or 0),
-        },
-        "from_db": lambda row: {
-            "id": row["id"],
-            "date": row["date"],
-            "category": row["category"] or "",
-            "seller": row["seller"] or "",
-            "items": row["items"] or "",
-            "orderNumber": row["order_number"] or "",
-            "total": float(row["total"] or 0),
-            "notes": row["notes"] or "",
-            "source": row["source"] or "",
-            "paidFrom": row["paid_from"] or "",
-            "deliveryFee": float(row["delivery_fee"] or 0),
-        },
+        "to_db": _expense_to_db,
+        "from_db": _expense_from_db,
+        "list_columns": [
+            "id",
+            "date",
+            "IFNULL(category, '') AS category",
+            "IFNULL(seller, '') AS seller",
+            "IFNULL(items, '') AS items",
+            "IFNULL(order_number, '') AS orderNumber",
+            "IFNULL(total, 0.0) AS total",
+            "IFNULL(notes, '') AS notes",
+            "IFNULL(source, '') AS source",
+            "IFNULL(paid_from, '') AS paidFrom",
+            "IFNULL(delivery_fee, 0.0) AS deliveryFee",
+        ],
         "csv_header": ["Date", "Category", "Seller", "Item(s)", "Order #", "TotalGBP", "DeliveryFeeGBP", "Notes", "Source", "Paid From"],
-        "csv_row": lambda rec: [
-            rec["date"],
-            rec["category"],
-            rec["seller"],
-            rec["items"],
-            rec["orderNumber"],
-            f'{rec["total"]:.2f}',
-            f'{float(rec.get("deliveryFee", 0) or 0):.2f}',
-            rec["notes"],
-            rec["source"],
-            rec.get("paidFrom", ""),
+        "csv_columns": [
+            "date",
+            "IFNULL(category, '')",
+            "IFNULL(seller, '')",
+            "IFNULL(items, '')",
+            "IFNULL(order_number, '')",
+            "IFNULL(total, 0)",
+            "IFNULL(delivery_fee, 0)",
+            "IFNULL(notes, '')",
+            "IFNULL(source, '')",
+            "IFNULL(paid_from, '')",
         ],
+        "csv_row": lambda r: (*r[:5], f"{r[5]:.2f}", f"{r[6]:.2f}", *r[7:]),
     },
     "payroll": {
         "table": "payroll",
         "columns": ["id", "date", "employee", "amount", "notes"],
-        "to_db": lambda payload: {
-            "id": str(payload.get("id") or generate_id()),
-            "date": (payload.get("date") or "").strip(),
-            "employee": (payload.get("employee") or "").strip(),
-            "amount": float(payload.get("amount") or 0),
-            "notes": (payload.get("notes") or "").strip(),
-        },
-        "from_db": lambda row: {
-            "id": row["id"],
-            "date": row["date"],
-            "employee": row["employee"] or "",
-            "amount": float(row["amount"] or 0),
-            "notes": row["notes"] or "",
-        },
-        "csv_header": ["Date", "Employee", "AmountGBP", "Notes"],
-        "csv_row": lambda rec: [
-            rec["date"],
-            rec["employee"],
-            f'{rec["amount"]:.2f}',
-            rec["notes"],
+        "to_db": _payroll_to_db,
+        "from_db": _payroll_from_db,
+        "list_columns": [
+            "id",
+            "date",
+            "IFNULL(employee, '') AS employee",
+            "IFNULL(amount, 0.0) AS amount",
+            "IFNULL(notes, '') AS notes",
         ],
+        "csv_header": ["Date", "Employee", "AmountGBP", "Notes"],
+        "csv_columns": ["date", "IFNULL(employee, '')", "IFNULL(amount, 0)", "IFNULL(notes, '')"],
+        "csv_row": lambda r: (r[0], r[1], f"{r[2]:.2f}", r[3]),
     },
 }
 
 
-with app.app_context():
-    init_db()
+def _build_sql(table: str, columns: list, list_columns: list, csv_columns: list) -> dict:
+    col_list = ", ".join(columns)
+    assignments = ", ".join(f"{col}=excluded.{col}" for col in columns if col != "id")
+    placeholders = ", ".join("?" * len(columns))
+    return {
+        "select_all": f"SELECT {', '.join(list_columns)} FROM {table} ORDER BY date DESC, updated_at DESC",
+        "select_one": f"SELECT {col_list} FROM {table} WHERE id = ?",
+        "csv_select": f"SELECT {', '.join(csv_columns)} FROM {table} ORDER BY date DESC, updated_at DESC",
+        "upsert": f"""INSERT INTO {table} ({col_list})
+            VALUES ({placeholders})
+            ON CONFLICT(id) DO UPDATE SET {assignments}, updated_at=CURRENT_TIMESTAMP""",
+        "upsert_returning": f"""INSERT INTO {table} ({col_list})
+            VALUES ({placeholders})
+            ON CONFLICT(id) DO UPDATE SET {assignments}, updated_at=CURRENT_TIMESTAMP
+            RETURNING {col_list}""",
+        "delete": f"DELETE FROM {table} WHERE id = ?",
+        "truncate": f"DELETE FROM {table}",
+        "count": f"SELECT COUNT(*) FROM {table}",
+        "change_count": f"SELECT n FROM change_counters WHERE tbl = '{table}'",
+    }
+
+
+# RETURNING lets writes hand back the stored row without a second SELECT
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# SQL is fixed per resource, so build it once at import instead of per request
+for _cfg in RESOURCE_CONFIG.values():
+    _cfg["sql"] = _build_sql(_cfg["table"], _cfg["columns"], _cfg["list_columns"], _cfg["csv_columns"])
+    # Positional upsert parameters, as a tuple in column order
+    _cfg["params"] = operator.itemgetter(*_cfg["columns"])
+
+# All resource counts in one statement, columns in RESOURCE_CONFIG order
+PING_SQL = "SELECT " + ", ".join(f"({cfg['sql']['count']})" for cfg in RESOURCE_CONFIG.values())
 
 
 def list_records(kind: str):
-    config = RESOURCE_CONFIG[kind]
     db = get_db()
-    rows = db.execute(
-        f"SELECT {', '.join(config['columns'])} FROM {config['table']} ORDER BY date DESC, updated_at DESC"
-    ).fetchall()
-    return [config["from_db"](row) for row in rows]
+    rows = db.execute(RESOURCE_CONFIG[kind]["sql"]["select_all"]).fetchall()
+    return [dict(row) for row in rows]
+
+
+# kind -> (change counter, etag, JSON body) of the last serialized list
+_LIST_CACHE = {}
+
+
+def list_records_json(kind: str):
+    # Reuse the serialized list until the table's change counter moves; the
+    # counter lives in the database, so writes from other workers count too
+    config = RESOURCE_CONFIG[kind]
+    version = get_db().execute(config["sql"]["change_count"]).fetchone()[0]
+    cached = _LIST_CACHE.get(kind)
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+    body = orjson.dumps(list_records(kind))
+    etag = hashlib.blake2s(body, digest_size=8).hexdigest()
+    _LIST_CACHE[kind] = (version, etag, body)
+    return etag, body
 
 
 def get_record(kind: str, record_id: str):
     config = RESOURCE_CONFIG[kind]
     db = get_db()
-    row = db.execute(
-        f"SELECT {', '.join(config['columns'])} FROM {config['table']} WHERE id = ?",
-        (record_id,),
-    ).fetchone()
+    row = db.execute(config["sql"]["select_one"], (record_id,)).fetchone()
     return config["from_db"](row) if row else None
 
 
-def list_attachments(kind: str, record_id: str):
+# Upper bound on attachments returned per request; page with ?limit=&offset=
+ATTACHMENT_PAGE_SIZE = 200
+
+
+def list_attachments(kind: str, record_id: str, limit: int = ATTACHMENT_PAGE_SIZE, offset: int = 0):
     db = get_db()
     rows = db.execute(
-        "SELECT id, kind, record_id, original_name, stored_name, mime_type, size, created_at FROM attachments WHERE kind = ? AND record_id = ? ORDER BY created_at DESC",
-        (kind, record_id),
+        "SELECT id, kind, record_id, original_name, stored_name, mime_type, size, created_at FROM attachments WHERE kind = ? AND record_id = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+        (kind, record_id, limit, offset),
     ).fetchall()
     return [_attachment_row_to_dict(r) for r in rows]
 
 
+# Multi-file uploads are written to disk in parallel; file I/O releases the
+# GIL. Threads start lazily, so a preloading gunicorn master never owns any.
+_UPLOAD_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=max(1, int(os.environ.get("UPLOAD_WORKERS", "4"))),
+    thread_name_prefix="upload",
+)
+
+
+def _write_upload(job) -> int:
+    dst, stream, data = job
+    # Take the size from the write position rather than a stat() afterwards
+    with open(dst, "wb") as out:
+        if data is None:
+            shutil.copyfileobj(stream, out)
+        else:
+            out.write(data)
+        return out.tell()
+
+
 def create_attachments(kind: str, record_id: str, files) -> list:
+    # files holds werkzeug FileStorage objects or, for content already in
+    # memory, (filename, mimetype, bytes) tuples
     saved = []
     if not files:
         return saved
-    record_dir = _ensure_record_dir(kind, record_id)
-    db = get_db()
+    record_dir = str(_ensure_record_dir(kind, record_id))
+    jobs, metas = [], []
     for fs in files:
-        if not fs or not getattr(fs, "filename", ""):
+        if isinstance(fs, tuple):
+            original, mimetype, data = fs
+            stream = None
+        else:
+            if not fs:
+                continue
+            original, mimetype, data = fs.filename, fs.mimetype, None
+            stream = fs.stream
+        if not original:
             continue
-        original = fs.filename
-        safe = secure_filename(original) or "file"
-        stored = f"{uuid4().hex}_{safe}"
-        dst = record_dir / stored
-        fs.save(dst)
-        try:
-            size = dst.stat().st_size
-        except Exception:
-            size = 0
-        att_id = uuid4().hex
-        db.execute(
-            """
-            INSERT INTO attachments (id, kind, record_id, original_name, stored_name, mime_type, size)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (att_id, kind, record_id, original, stored, getattr(fs, "mimetype", None), size),
-        )
+        # original_name keeps the client's name; on disk only a random id plus
+        # a plain extension (for MIME sniffing) is used, so no path tricks apply
+        ext = os.path.splitext(original)[1]
+        stored = os.urandom(16).hex() + (ext if _SAFE_EXT_RE.fullmatch(ext) else "")
+        jobs.append((os.path.join(record_dir, stored), stream, data))
+        metas.append((original, mimetype, stored))
+    if len(jobs) > 1:
+        sizes = list(_UPLOAD_POOL.map(_write_upload, jobs))
+    else:
+        sizes = [_write_upload(job) for job in jobs]
+    rows = []
+    for (original, mimetype, stored), size in zip(metas, sizes):
+        att_id = generate_id()
+        rows.append((att_id, kind, record_id, original, stored, mimetype, size))
         saved.append(
             {
                 "id": att_id,
                 "kind": kind,
                 "recordId": record_id,
                 "name": original,
-                "mime": getattr(fs, "mimetype", "") or "",
+                "mime": mimetype or "",
                 "size": int(size),
                 "url": f"/uploads/{kind}/{record_id}/{stored}",
             }
         )
-    db.commit()
+    if not rows:
+        return saved
+    # Files are already on disk; insert all rows in one write transaction
+    with write_transaction(get_db()) as db:
+        db.executemany(
+            """
+            INSERT INTO attachments (id, kind, record_id, original_name, stored_name, mime_type, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
     return saved
 
 
@@ -374,7 +743,6 @@ def set_setting(key: str, value):
                 "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
                 (key, text),
             )
-    db.commit()
 
 
 def _stringify(value) -> str:
@@ -402,13 +770,22 @@ def _stringify(value) -> str:
     return str(value).strip()
 
 
+_JSON_FENCE_START_RE = re.compile(r"^```(?:json)?\s*", re.IGNORECASE)
+_JSON_FENCE_END_RE = re.compile(r"\s*```$", re.IGNORECASE)
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+_DATE_YMD_RE = re.compile(r"(\d{4})[^\d]?(\d{1,2})[^\d]?(\d{1,2})")
+_DATE_DMY_RE = re.compile(r"(\d{1,2})[^\d]?(\d{1,2})[^\d]?(\d{2,4})")
+_AMOUNT_NUM_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_AMOUNT_STRIP_RE = re.compile(r"[^\d\.\-]")
+
+
 def _extract_json_object(text: str) -> dict:
     if not text:
         return {}
     cleaned = text.strip()
     if cleaned.startswith("```"):
-        cleaned = re.sub(r"^```(?:json)?\s*", "", cleaned, flags=re.IGNORECASE)
-        cleaned = re.sub(r"\s*```$", "", cleaned, flags=re.IGNORECASE)
+        cleaned = _JSON_FENCE_START_RE.sub("", cleaned)
+        cleaned = _JSON_FENCE_END_RE.sub("", cleaned)
     cleaned = cleaned.strip()
     try:
         data = json.loads(cleaned)
@@ -416,7 +793,7 @@ def _extract_json_object(text: str) -> dict:
             return data
     except json.JSONDecodeError:
         pass
-    match = re.search(r"\{.*\}", cleaned, re.DOTALL)
+    match = _JSON_OBJECT_RE.search(cleaned)
     if match:
         snippet = match.group(0)
         try:
@@ -431,9 +808,20 @@ def _extract_json_object(text: str) -> dict:
 def _normalize_date(value: str) -> str:
     if not value:
         return ""
-    text = str(value).strip()
+    return _normalize_date_text(str(value).strip())
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_date_text(text: str) -> str:
     if not text:
         return ""
+    # Fast path: already YYYY-MM-DD
+    if len(text) == 10 and text[4] == "-" and text[7] == "-":
+        try:
+            date.fromisoformat(text)
+            return text
+        except ValueError:
+            pass
     normal = text.replace("Z", "")
     try:
         dt = datetime.fromisoformat(normal)
@@ -458,13 +846,13 @@ def _normalize_date(value: str) -> str:
         except ValueError:
             continue
     # Attempt YYYYMMDD or DDMMYYYY style strings
-    match = re.search(r"(\d{4})[^\d]?(\d{1,2})[^\d]?(\d{1,2})", text)
+    match = _DATE_YMD_RE.search(text)
     if match:
         try:
             return datetime(int(match.group(1)), int(match.group(2)), int(match.group(3))).date().isoformat()
         except ValueError:
             pass
-    match = re.search(r"(\d{1,2})[^\d]?(\d{1,2})[^\d]?(\d{2,4})", text)
+    match = _DATE_DMY_RE.search(text)
     if match:
         year = int(match.group(3))
         if year < 100:
@@ -485,19 +873,47 @@ def _coerce_amount(value) -> float:
     if not text:
         return 0.0
     text = text.replace(",", "")
-    match = re.findall(r"-?\d+(?:\.\d+)?", text)
+    match = _AMOUNT_NUM_RE.findall(text)
     if match:
         try:
             return float(match[-1])
         except ValueError:
             pass
-    filtered = re.sub(r"[^\d\.\-]", "", text)
+    filtered = _AMOUNT_STRIP_RE.sub("", text)
     try:
         return float(filtered)
     except ValueError:
         return 0.0
 
 
+# Keys a model may use for each expense field, in order of preference
+_SCAN_FIELD_ALIASES = {
+    "date": ("date", "purchase_date", "transaction_date", "invoice_date"),
+    "category": ("category",),
+    "seller": ("seller", "merchant", "vendor"),
+    "items": ("items", "lineItems", "description"),
+    "orderNumber": ("orderNumber", "order_number", "invoiceNumber", "reference"),
+    "total": ("total", "amount"),
+    "deliveryFee": ("deliveryFee", "delivery_fee"),
+    "notes": ("notes", "additionalNotes"),
+    "source": ("source", "paymentMethod"),
+    "paidFrom": ("paidFrom", "account"),
+}
+
+
+def _pick_scan_fields(extracted: dict) -> dict:
+    # First truthy value per field across its aliases, None when all are empty
+    picked = {}
+    for field, aliases in _SCAN_FIELD_ALIASES.items():
+        value = None
+        for alias in aliases:
+            value = extracted.get(alias)
+            if value:
+                break
+        picked[field] = value or None
+    return picked
+
+
 def get_attachment(att_id: str):
     db = get_db()
     row = db.execute(
@@ -521,80 +937,132 @@ def get_attachment_by_storage(kind: str, record_id: str, stored_name: str):
 
 
 def delete_attachment(att_id: str) -> bool:
-    row = get_attachment(att_id)
+    db = get_db()
+    if HAS_RETURNING:
+        # Look up and delete the row in one statement
+        row = db.execute(
+            "DELETE FROM attachments WHERE id = ? RETURNING kind, record_id, stored_name",
+            (att_id,),
+        ).fetchone()
+    else:
+        row = get_attachment(att_id)
+        if row:
+            db.execute("DELETE FROM attachments WHERE id = ?", (att_id,))
     if not row:
         return False
     # attempt to delete file from disk
     try:
-        file_path = UPLOAD_DIR / row["kind"] / row["record_id"] / row["stored_name"]
-        if file_path.exists():
-            file_path.unlink(missing_ok=True)  # type: ignore[arg-type]
-    except Exception:
+        os.unlink(os.path.join(UPLOAD_DIR_STR, row["kind"], row["record_id"], row["stored_name"]))
+    except OSError:
         pass
-    db = get_db()
-    res = db.execute("DELETE FROM attachments WHERE id = ?", (att_id,))
-    db.commit()
-    return res.rowcount > 0
+    return True
 
 
-def upsert_record(kind: str, payload: dict):
-    config = RESOURCE_CONFIG[kind]
-    row_data = config["to_db"](payload or {})
+def _validated_row(kind: str, payload: dict) -> dict:
+    row_data = RESOURCE_CONFIG[kind]["to_db"](payload or {})
     if not row_data["date"]:
         raise ValueError("date is required")
     if kind == "payroll" and not row_data["employee"]:
         raise ValueError("employee is required")
+    return row_data
 
-    columns = config["columns"]
-    assignments = ", ".join(f"{col}=excluded.{col}" for col in columns if col != "id")
-    placeholders = ", ".join(f":{col}" for col in columns)
 
+def upsert_record(kind: str, payload: dict):
+    config = RESOURCE_CONFIG[kind]
+    row_data = _validated_row(kind, payload)
+    params = config["params"](row_data)
     db = get_db()
-    db.execute(
-        f"""INSERT INTO {config['table']} ({', '.join(columns)})
-            VALUES ({placeholders})
-            ON CONFLICT(id) DO UPDATE SET {assignments}, updated_at=CURRENT_TIMESTAMP""",
-        row_data,
-    )
-    db.commit()
+    if HAS_RETURNING:
+        rows = db.execute(config["sql"]["upsert_returning"], params).fetchall()
+        return config["from_db"](rows[0])
+    db.execute(config["sql"]["upsert"], params)
     return get_record(kind, row_data["id"])
 
 
+def upsert_records(kind: str, payloads: list) -> list:
+    # Bulk import: validate everything first, then write all rows in one
+    # transaction so a bad record leaves the table untouched
+    config = RESOURCE_CONFIG[kind]
+    rows = []
+    for index, payload in enumerate(payloads):
+        if not isinstance(payload, dict):
+            raise ValueError(f"record {index}: expected an object")
+        try:
+            rows.append(_validated_row(kind, payload))
+        except ValueError as exc:
+            raise ValueError(f"record {index}: {exc}") from None
+    if rows:
+        with write_transaction(get_db()) as db:
+            db.executemany(config["sql"]["upsert"], map(config["params"], rows))
+    return [row["id"] for row in rows]
+
+
 def delete_record(kind: str, record_id: str):
     config = RESOURCE_CONFIG[kind]
-    db = get_db()
-    result = db.execute(
-        f"DELETE FROM {config['table']} WHERE id = ?",
-        (record_id,),
-    )
-    deleted = result.rowcount > 0
-    # If a record was deleted, also remove its attachments (DB + files)
-    if deleted and kind in ("income", "expenses"):
-        _remove_record_dir(kind, record_id)
-        db.execute("DELETE FROM attachments WHERE kind = ? AND record_id = ?", (kind, record_id))
-    db.commit()
+    with write_transaction(get_db()) as db:
+        result = db.execute(config["sql"]["delete"], (record_id,))
+        deleted = result.rowcount > 0
+        # If a record was deleted, also remove its attachments (DB + files)
+        if deleted and kind in ("income", "expenses"):
+            _remove_record_dir(kind, record_id)
+            db.execute("DELETE FROM attachments WHERE kind = ? AND record_id = ?", (kind, record_id))
     return deleted
 
 
-def clear_records(kind: str):
+def _compact_db(db: sqlite3.Connection):
+    # Hand the freed pages back to the filesystem; rewrites the whole file.
+    # In WAL mode VACUUM lands in the WAL, so checkpoint afterwards to shrink
+    # the main file and truncate the WAL.
+    db.execute("VACUUM")
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def clear_records(kind: str, vacuum: bool = False):
     config = RESOURCE_CONFIG[kind]
-    db = get_db()
-    db.execute(f"DELETE FROM {config['table']}")
-    if kind in ("income", "expenses"):
-        db.execute("DELETE FROM attachments WHERE kind = ?", (kind,))
-        shutil.rmtree(UPLOAD_DIR / kind, ignore_errors=True)
-    db.commit()
+    with write_transaction(get_db()) as db:
+        db.execute(config["sql"]["truncate"])
+        if kind in ("income", "expenses"):
+            db.execute("DELETE FROM attachments WHERE kind = ?", (kind,))
+            shutil.rmtree(UPLOAD_DIR / kind, ignore_errors=True)
+    if vacuum:
+        _compact_db(db)
+
+
+# Same output as csv.writer's default excel dialect (QUOTE_MINIMAL, CRLF),
+# without its per-cell dialect checks
+_CSV_NEEDS_QUOTES_RE = re.compile(r'[,"\r\n]')
+
+
+def _csv_line(fields) -> str:
+    out = []
+    for value in fields:
+        text = value if isinstance(value, str) else str(value)
+        if _CSV_NEEDS_QUOTES_RE.search(text):
+            text = '"' + text.replace('"', '""') + '"'
+        out.append(text)
+    return ",".join(out) + "\r\n"
 
 
-def export_csv(kind: str) -> str:
+CSV_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(kind: str):
+    # Stream the export in ~64 KB chunks, reading lazily from the cursor, so
+    # the server writes a few large chunks instead of one per row
     config = RESOURCE_CONFIG[kind]
-    records = list_records(kind)
-    output = io.StringIO()
-    writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(config["csv_header"])
-    for record in records:
-        writer.writerow(config["csv_row"](record))
-    return output.getvalue()
+    csv_row = config["csv_row"]
+    # Plain tuples in CSV column order; no sqlite3.Row per record
+    cursor = get_db().cursor()
+    cursor.row_factory = None
+    cursor.execute(config["sql"]["csv_select"])
+    buf = bytearray(_csv_line(config["csv_header"]).encode("utf-8"))
+    for row in cursor:
+        buf += _csv_line(csv_row(row)).encode("utf-8")
+        if len(buf) >= CSV_CHUNK_SIZE:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
 
 
 
@@ -602,13 +1070,15 @@ def export_csv(kind: str) -> str:
 """Factory reset helpers"""
 
 
+FACTORY_RESET_SQL = "".join(
+    f"{cfg['sql']['truncate']};\n" for cfg in RESOURCE_CONFIG.values()
+) + "DELETE FROM attachments;\nDELETE FROM settings;\n"
+
+
 def factory_reset():
     db = get_db()
-    for cfg in RESOURCE_CONFIG.values():
-        db.execute(f"DELETE FROM {cfg['table']}")
-    db.execute("DELETE FROM attachments")
-    db.execute("DELETE FROM settings")
-    db.commit()
+    db.executescript(f"BEGIN IMMEDIATE;\n{FACTORY_RESET_SQL}COMMIT;")
+    _compact_db(db)
     shutil.rmtree(UPLOAD_DIR, ignore_errors=True)
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -628,30 +1098,35 @@ def version():
     return jsonify({"version": ver})
 
 
+_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Accept",
+}
+_CORS_PREFLIGHT = ("", 204, _CORS_HEADERS)
+
+
 @app.after_request
 def add_cors_headers(response):
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET,POST,PUT,DELETE,OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Accept"
+    # Only the API is called cross-origin; pages, assets and uploads are
+    # same-origin or plain navigations
+    if request.path.startswith("/api/"):
+        response.headers.update(_CORS_HEADERS)
     return response
 
 
-@app.route("/api/<path:_any>", methods=["OPTIONS"])
-def cors_preflight(_any):
-    return ("", 204, {
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Accept",
-    })
+@app.before_request
+def cors_preflight():
+    # Answer preflights before view dispatch; Flask builds a fresh response
+    # from the tuple, so no Response object is shared between threads
+    if request.method == "OPTIONS" and request.path.startswith("/api/"):
+        return _CORS_PREFLIGHT
 
 
 @app.route("/api/ping")
 def ping():
     db = get_db()
-    counts = {
-        kind: db.execute(f"SELECT COUNT(*) FROM {config['table']}").fetchone()[0]
-        for kind, config in RESOURCE_CONFIG.items()
-    }
+    counts = dict(zip(RESOURCE_CONFIG, db.execute(PING_SQL).fetchone()))
     return jsonify({"ok": True, "counts": counts})
 
 
@@ -659,10 +1134,9 @@ def ping():
 def download_csv(kind):
     if kind not in RESOURCE_CONFIG:
         return jsonify({"error": "Unknown resource"}), 404
-    csv_text = export_csv(kind)
     filename = f"{kind}-{request.args.get('date', '') or 'export'}.csv"
     return Response(
-        csv_text,
+        stream_with_context(iter_csv(kind)),
         mimetype="text/csv; charset=utf-8",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
@@ -677,7 +1151,10 @@ def attachments_collection(kind, record_id):
     if not rec:
         return jsonify({"error": "Parent record not found"}), 404
     if request.method == "GET":
-        return jsonify(list_attachments(kind, record_id))
+        limit = request.args.get("limit", ATTACHMENT_PAGE_SIZE, type=int)
+        offset = request.args.get("offset", 0, type=int)
+        limit = max(1, min(limit, ATTACHMENT_PAGE_SIZE))
+        return jsonify(list_attachments(kind, record_id, limit, max(0, offset)))
     # POST: upload files via multipart form
     if not request.files:
         return jsonify({"error": "No files uploaded"}), 400
@@ -688,25 +1165,37 @@ def attachments_collection(kind, record_id):
 
 @app.route("/api/attachments/<att_id>", methods=["GET", "DELETE"])
 def attachments_detail(att_id):
-    row = get_attachment(att_id)
-    if not row:
-        return jsonify({"error": "Not found"}), 404
     if request.method == "GET":
+        row = get_attachment(att_id)
+        if not row:
+            return jsonify({"error": "Not found"}), 404
         return jsonify(_attachment_row_to_dict(row))
     # DELETE
     ok = delete_attachment(att_id)
     return (jsonify({"deleted": True}), 200) if ok else (jsonify({"error": "Not found"}), 404)
 
 
+def _accel_redirect(row) -> Response:
+    # Empty response telling nginx to serve the file itself from its internal
+    # location (sendfile, no copy through Python)
+    resp = Response(mimetype=row["mime_type"] or "application/octet-stream")
+    resp.headers["X-Accel-Redirect"] = (
+        f"{UPLOADS_ACCEL_PREFIX}/{row['kind']}/{row['record_id']}/{row['stored_name']}"
+    )
+    return resp
+
+
 @app.route("/api/attachments/<att_id>/download")
 def attachments_download(att_id):
     row = get_attachment(att_id)
     if not row:
         return jsonify({"error": "Not found"}), 404
-    folder = UPLOAD_DIR / row["kind"] / row["record_id"]
-    filename = row["stored_name"]
+    if UPLOADS_ACCEL_PREFIX:
+        resp = _accel_redirect(row)
+    else:
+        folder = os.path.join(UPLOAD_DIR_STR, row["kind"], row["record_id"])
+        resp = send_from_directory(folder, row["stored_name"])
     # return with original filename hint
-    resp = send_from_directory(folder, filename)
     try:
         disp = f"inline; filename={row['original_name']}"
         resp.headers["Content-Disposition"] = disp
@@ -804,15 +1293,19 @@ def api_expense_scan():
         ],
         "temperature": 0.1,
     }
+    # Serialize once ourselves and drop the base64 intermediates, so only the
+    # encoded request bytes stay resident while waiting on the model
+    request_body = orjson.dumps(body)
+    del body, user_blocks, encoded_image
 
     try:
-        llm_response = requests.post(endpoint, headers=headers, json=body, timeout=60)
+        llm_response = _LLM_SESSION.post(endpoint, headers=headers, data=request_body, timeout=60)
         llm_response.raise_for_status()
     except requests.RequestException as exc:
         return jsonify({"error": f"Failed to contact LLM endpoint: {exc}"}), 502
 
     try:
-        payload = llm_response.json()
+        payload = orjson.loads(llm_response.content)
     except ValueError:
         return jsonify({"error": "LLM response was not valid JSON payload"}), 502
 
@@ -829,41 +1322,18 @@ def api_expense_scan():
     except ValueError as exc:
         return jsonify({"error": str(exc), "raw": message_text}), 502
 
+    picked = _pick_scan_fields(extracted)
     normalized_payload = {
-        "date": _normalize_date(
-            extracted.get("date")
-            or extracted.get("purchase_date")
-            or extracted.get("transaction_date")
-            or extracted.get("invoice_date")
-        ),
-        "category": (_stringify(extracted.get("category")) or "Imported") or "Imported",
-        "seller": _stringify(
-            extracted.get("seller") or extracted.get("merchant") or extracted.get("vendor")
-        ),
-        "items": _stringify(
-            extracted.get("items")
-            or extracted.get("lineItems")
-            or extracted.get("description")
-        ),
-        "orderNumber": _stringify(
-            extracted.get("orderNumber")
-            or extracted.get("order_number")
-            or extracted.get("invoiceNumber")
-            or extracted.get("reference")
-        ),
-        "total": _coerce_amount(extracted.get("total") or extracted.get("amount")),
-        "deliveryFee": _coerce_amount(
-            extracted.get("deliveryFee") or extracted.get("delivery_fee") or 0
-        ),
-        "notes": _stringify(
-            extracted.get("notes") or extracted.get("additionalNotes") or ""
-        ),
-        "source": _stringify(
-            extracted.get("source") or extracted.get("paymentMethod") or ""
-        ),
-        "paidFrom": _stringify(
-            extracted.get("paidFrom") or extracted.get("account") or ""
-        ),
+        "date": _normalize_date(picked["date"]),
+        "category": _stringify(picked["category"]) or "Imported",
+        "seller": _stringify(picked["seller"]),
+        "items": _stringify(picked["items"]),
+        "orderNumber": _stringify(picked["orderNumber"]),
+        "total": _coerce_amount(picked["total"]),
+        "deliveryFee": _coerce_amount(picked["deliveryFee"]),
+        "notes": _stringify(picked["notes"]),
+        "source": _stringify(picked["source"]),
+        "paidFrom": _stringify(picked["paidFrom"]),
     }
 
     if not normalized_payload["date"]:
@@ -903,11 +1373,8 @@ def api_expense_scan():
             400,
         )
 
-    try:
-        upload.stream.seek(0)
-    except Exception:
-        upload.stream = io.BytesIO(raw_bytes)
-    attachments = create_attachments("expenses", stored["id"], [upload])
+    # The upload is already buffered in raw_bytes; write it out directly
+    attachments = create_attachments("expenses", stored["id"], [(upload.filename, upload.mimetype, raw_bytes)])
 
     return jsonify(
         {
@@ -926,13 +1393,16 @@ def serve_upload(kind, record_id, filename):
     row = get_attachment_by_storage(kind, record_id, filename)
     if not row:
         return jsonify({"error": "Not found"}), 404
-    base = UPLOAD_DIR.resolve()
-    target = (base / kind / record_id / filename).resolve()
-    if base not in target.parents:
+    target = os.path.realpath(os.path.join(UPLOAD_DIR_REAL, kind, record_id, filename))
+    if not target.startswith(UPLOAD_DIR_REAL + os.sep):
         return jsonify({"error": "Not found"}), 404
-    if not target.exists() or not target.is_file():
+    if not os.path.isfile(target):
         return jsonify({"error": "Not found"}), 404
-    resp = send_from_directory(target.parent, target.name)
+    if UPLOADS_ACCEL_PREFIX:
+        resp = _accel_redirect(row)
+    else:
+        folder, name = os.path.split(target)
+        resp = send_from_directory(folder, name)
     mime = row["mime_type"]
     if mime:
         resp.headers.setdefault("Content-Type", mime)
@@ -949,21 +1419,28 @@ def collection(kind):
         return jsonify({"error": "Unknown resource"}), 404
 
     if request.method == "GET":
-        return jsonify(list_records(kind))
+        etag, body = list_records_json(kind)
+        resp = Response(body, mimetype="application/json")
+        resp.set_etag(etag)
+        return resp.make_conditional(request)
 
     if request.method == "POST":
         try:
-            data = request.get_json(force=True, silent=False) or {}
+            data = request.get_json(force=True, silent=False)
         except Exception:
             return jsonify({"error": "Invalid JSON"}), 400
         try:
+            if isinstance(data, list):
+                return jsonify({"ids": upsert_records(kind, data)})
             stored = upsert_record(kind, data)
         except ValueError as exc:
             return jsonify({"error": str(exc)}), 400
         return jsonify(stored)
 
     if request.method == "DELETE":
-        clear_records(kind)
+        # ?vacuum=1 also shrinks the database file (opt-in: VACUUM is slow)
+        vacuum = request.args.get("vacuum", "").strip().lower() in ("1", "true", "yes")
+        clear_records(kind, vacuum=vacuum)
         return jsonify({"cleared": True})
 
     return jsonify({"error": "Unsupported method"}), 405
@@ -999,22 +1476,84 @@ def resource_detail(kind, record_id):
     return jsonify({"error": "Unsupported method"}), 405
 
 
+# Small front-end files in ROOT are read (and gzipped) once at startup and
+# served from memory. Edits need a restart; set STATIC_CACHE=0 while working
+# on the pages.
+STATIC_CACHE_EXTENSIONS = {".html", ".css", ".js", ".svg", ".png", ".ico"}
+STATIC_CACHE_MAX_BYTES = 256 * 1024
+_GZIP_MIME_PREFIXES = ("text/", "application/javascript", "image/svg+xml")
+
+
+def _load_static_cache() -> dict:
+    cache = {}
+    if os.environ.get("STATIC_CACHE", "1").strip().lower() in ("0", "false", "no"):
+        return cache
+    with os.scandir(ROOT_STR) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1].lower() not in STATIC_CACHE_EXTENSIONS:
+                continue
+            if not entry.is_file():
+                continue
+            st = entry.stat()
+            if st.st_size > STATIC_CACHE_MAX_BYTES:
+                continue
+            with open(entry.path, "rb") as fh:
+                data = fh.read()
+            mime = mimetypes.guess_type(entry.name)[0] or "application/octet-stream"
+            gz = None
+            if mime.startswith(_GZIP_MIME_PREFIXES):
+                gz = gzip.compress(data, 6, mtime=0)
+                if len(gz) >= len(data):
+                    gz = None
+            etag = hashlib.blake2s(data, digest_size=8).hexdigest()
+            cache[entry.name] = (data, gz, etag, mime, int(st.st_mtime))
+    return cache
+
+
+_STATIC_CACHE = _load_static_cache()
+
+
+def _cached_static(filename: str):
+    entry = _STATIC_CACHE.get(filename)
+    if entry is None:
+        return None
+    data, gz, etag, mime, mtime = entry
+    use_gz = gz is not None and request.accept_encodings.quality("gzip") > 0
+    resp = Response(gz if use_gz else data, mimetype=mime)
+    if gz is not None:
+        resp.vary.add("Accept-Encoding")
+    if use_gz:
+        resp.headers["Content-Encoding"] = "gzip"
+        etag += "-gz"
+    resp.set_etag(etag)
+    resp.last_modified = mtime
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
 @app.route("/")
 def root():
-    return send_from_directory(ROOT, "financial_summary.html")
+    cached = _cached_static("financial_summary.html")
+    if cached is not None:
+        return cached
+    return send_from_directory(ROOT_STR, "financial_summary.html")
 
 
 @app.route("/<path:filename>")
 def static_files(filename):
-    file_path = ROOT / filename
-    if not file_path.is_file():
+    cached = _cached_static(filename)
+    if cached is not None:
+        return cached
+    if not os.path.isfile(os.path.join(ROOT_STR, filename)):
         return jsonify({"error": "Not found"}), 404
-    return send_from_directory(ROOT, filename)
+    return send_from_directory(ROOT_STR, filename)
 
 
 # Ensure database schema exists whenever the module loads (e.g., under Gunicorn)
-with app.app_context():
+with app.app_context(), _schema_lock():
     init_db()
+# Don't carry the import-time connection into forked workers (gunicorn preload)
+close_db()
 
 
 if __name__ == "__main__":